@@ -0,0 +1,26 @@
+# ==========================================
+# 🛠️ 预编译数值内核 (numba AOT)
+# ==========================================
+# 部署/构建镜像时在 pip install 之后运行一次：python build_kernels.py（需要 C 编译器）
+# 生成 signal_kernels 扩展模块，cloud_app.py 直接 import，新进程不再付 JIT 编译的冷启动
+# 未构建时 cloud_app.py 自动退回纯 NumPy / JIT 实现，功能不受影响
+import os
+import warnings
+
+from numba.core.errors import NumbaPendingDeprecationWarning
+
+# numba.pycc 已标记为待弃用，导入时会告警；在有替代方案前继续使用
+with warnings.catch_warnings():
+    warnings.simplefilter('ignore', NumbaPendingDeprecationWarning)
+    from numba.pycc import CC
+
+import kernels
+
+cc = CC('signal_kernels')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+cc.export('rolling_corr', 'f4[:](f8[:], f8[:], i8)')(kernels.rolling_corr)
+cc.export('lttb_indices', 'i8[:](f8[:], f8[:], i8)')(kernels.lttb_indices)
+
+if __name__ == '__main__':
+    cc.compile()
@@ -1,146 +1,350 @@
 import streamlit as st
 import pandas as pd
-import pandas_datareader.data as web
+import numpy as np
+import bottleneck as bn
+import requests
+import requests_cache
+from curl_cffi import requests as curl_requests
 import yfinance as yf
 import datetime
+from io import StringIO
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 import plotly.graph_objects as go
+import plotly.io as pio
 from plotly.subplots import make_subplots
 
+# 优先使用 build_kernels.py 预编译的 C 扩展；未编译时相关性走纯 NumPy 窗口版，
+# 信号计算不必等 JIT 预热，降采样内核退回 numba JIT
+try:
+    import signal_kernels as _aot
+
+    # AOT 入口没有类型检查，dtype/内存布局不符会直接段错误，这里统一转换
+    def rolling_corr(x, y, w):
+        return _aot.rolling_corr(np.ascontiguousarray(x, dtype=np.float64),
+                                 np.ascontiguousarray(y, dtype=np.float64), int(w))
+
+    def lttb_indices(x, y, n_out):
+        return _aot.lttb_indices(np.ascontiguousarray(x, dtype=np.float64),
+                                 np.ascontiguousarray(y, dtype=np.float64), int(n_out))
+except ImportError:
+    from numba import njit
+    import kernels
+    rolling_corr = kernels.rolling_corr_windows
+    lttb_indices = njit(cache=True)(kernels.lttb_indices)
+
 # ==========================================
 # 🔧 网页配置
 # ==========================================
 st.set_page_config(
-    page_title="Macro Radar (Real-Time Pro)",
+    page_title="Macro Radar",
     page_icon="📡",
     layout="wide"
 )
 
+# ==========================================
+# ⚙️ 运行模式配置
+# ==========================================
+@dataclass(frozen=True)
+class AppConfig:
+    ttl: int                                  # 行情缓存秒数
+    join: str = "inner"                       # 流动性与 BTC 的对齐方式
+    ffill_after_join: bool = False            # 对齐后是否前向填充（配合 outer 使用）
+    include_correlation_signal: bool = True   # STRONG LONG 是否要求相关性 > 0.5
+    fetch_live_minute: bool = False           # 是否额外抓取 1 分钟 K 线作为实时价
+
+PRESETS = {
+    "Realtime Pro": AppConfig(ttl=60, join="outer", ffill_after_join=True,
+                              include_correlation_signal=False, fetch_live_minute=True),
+    "Live": AppConfig(ttl=300, join="outer", ffill_after_join=True),
+    "Cloud": AppConfig(ttl=3600),
+}
+# 缓存装饰器的 ttl 只能写死，各模式的 ttl 通过时间分桶参数生效
+MAX_TTL = max(cfg.ttl for cfg in PRESETS.values())
+
+# ==========================================
+# 💾 本地历史缓存 (Parquet)
+# ==========================================
+# 历史部分不会变，落盘后每次只补抓最近一段；重叠 7 天覆盖美联储周度数据的修订
+CACHE_PATH = os.path.join(tempfile.gettempdir(), "macro_radar_cache.parquet")
+CACHE_OVERLAP = datetime.timedelta(days=7)
+# 超过这个时间的缓存整体作废重抓，让超出重叠窗口的历史修订也能进来
+CACHE_MAX_AGE = datetime.timedelta(days=7)
+HISTORY_COLUMNS = ['Net_Liquidity', 'BTC_Price']
+
+def _load_history():
+    # 缓存文件位于共享临时目录，过期、结构不符（旧版本/其他程序写的）一律当作没有缓存
+    try:
+        age = time.time() - os.path.getmtime(CACHE_PATH)
+        if age > CACHE_MAX_AGE.total_seconds(): return None
+        history = pd.read_parquet(CACHE_PATH)
+        if not isinstance(history.index, pd.DatetimeIndex) or history.index.tz is not None: return None
+        if not set(HISTORY_COLUMNS).issubset(history.columns): return None
+        return history[HISTORY_COLUMNS].astype('float64').sort_index()
+    except Exception:
+        return None
+
+def _clear_history():
+    try:
+        os.remove(CACHE_PATH)
+    except OSError:
+        pass
+
+def _save_history(history):
+    # 先写临时文件再 os.replace，避免并发会话读到写了一半的文件
+    # 缓存只是加速用，任何写入失败都吞掉，不能影响本次数据加载
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(CACHE_PATH), suffix=".parquet")
+        os.close(fd)
+        history.to_parquet(tmp_path, compression='zstd')
+        os.replace(tmp_path, CACHE_PATH)
+    except Exception:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            try: os.remove(tmp_path)
+            except OSError: pass
+
+def _tail_start(history, column, default):
+    # 从该列最后一个有效日期往前回退 CACHE_OVERLAP 开始补抓
+    last = history[column].last_valid_index() if history is not None else None
+    if last is None: return default
+    return max((last - CACHE_OVERLAP).strftime('%Y-%m-%d'), default)
+
 # ==========================================
 # 📥 数据获取核心
 # ==========================================
-@st.cache_data(ttl=60) # 缩短缓存到 60秒，保证价格新鲜
-def get_market_data():
-    # 设定时间窗口
-    start_date = (datetime.datetime.now() - datetime.timedelta(days=1095)).strftime('%Y-%m-%d')
-    # 🌟 关键修正：结束日期设为“明天”，确保包含“今天”的实时K线
-    end_date = (datetime.datetime.now() + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
-
-    # --- 1. 获取美联储流动性 (FRED) ---
+def _naive_index(index):
+    # 统一成无时区的 datetime64[ns]（按 UTC 解释），concat 对齐走快速路径
+    return pd.to_datetime(index, utc=True).tz_convert(None).as_unit('ns')
+
+# fredgraph.csv 一次请求返回全部序列，每条序列的参数用逗号分隔
+FRED_CSV_URL = "https://fred.stlouisfed.org/graph/fredgraph.csv"
+FRED_SERIES = ['WALCL', 'WTREGEN', 'RRPONTSYD']
+
+@st.cache_resource
+def _http_session():
+    # 跨 rerun 复用同一个连接池；60 秒内的重复请求直接读磁盘缓存
+    # 缓存目录不可写时退回普通 Session，只丢掉磁盘缓存，不影响取数
     try:
-        # 注意：这里 end_date 用今天即可，因为美联储数据没那么快
-        fred_end = datetime.datetime.now().strftime('%Y-%m-%d')
-        fred_data = web.DataReader(['WALCL', 'WTREGEN', 'RRPONTSYD'], 'fred', start_date, fred_end)
-        fred_data = fred_data.ffill().dropna()
-        fred_data['Net_Liquidity'] = (fred_data['WALCL'] - fred_data['WTREGEN'] - fred_data['RRPONTSYD']) / 1000
-        
-        # 清洗时间索引
-        fred_data.index = pd.to_datetime(fred_data.index)
-        if fred_data.index.tz is not None: fred_data.index = fred_data.index.tz_localize(None)
+        return requests_cache.CachedSession(os.path.join(tempfile.gettempdir(), 'fred_http'), expire_after=60)
+    except Exception:
+        return requests.Session()
+
+@st.cache_resource
+def _yf_session():
+    # yfinance (>=1.5.2，见 requirements.txt) 只接受不带缓存的 curl_cffi session，这里只做连接复用：
+    # 不传时每次 download 都会新建 session、重新握手
+    return curl_requests.Session(impersonate="chrome")
+
+@st.cache_resource
+def _fetch_pool():
+    # 线程池常驻：curl 句柄按线程保存，线程不销毁，连接才能在多次取数之间复用
+    return ThreadPoolExecutor(max_workers=3)
+
+def _fetch_fred(session, start_date, end_date):
+    params = {
+        'id': ','.join(FRED_SERIES),
+        'cosd': ','.join([start_date] * len(FRED_SERIES)),
+        'coed': ','.join([end_date] * len(FRED_SERIES)),
+    }
+    resp = session.get(FRED_CSV_URL, params=params, timeout=10)
+    resp.raise_for_status()
+    # 第一列是日期（列名 observation_date / DATE 随版本变化），缺失值为 "."
+    fred_data = pd.read_csv(StringIO(resp.text), index_col=0, parse_dates=True, na_values='.')
+    fred_data = fred_data.ffill().dropna()
+    fred_data['Net_Liquidity'] = (fred_data['WALCL'] - fred_data['WTREGEN'] - fred_data['RRPONTSYD']) / 1000
+    
+    # 清洗时间索引
+    fred_data.index = _naive_index(fred_data.index)
+    return fred_data
+
+def _fetch_btc_daily(session, start_date, end_date):
+    btc_data = yf.download('BTC-USD', start=start_date, end=end_date, interval="1d", progress=False, session=session)
+    # 不管是否带 Ticker 层级，都只取 Close 的第一列并统一命名为 BTC_Price
+    close = btc_data.xs('Close', axis=1, level=0) if isinstance(btc_data.columns, pd.MultiIndex) else btc_data[['Close']]
+    btc_df = close.iloc[:, [0]].set_axis(['BTC_Price'], axis=1)
+    
+    # 清洗
+    btc_df.index = _naive_index(btc_df.index)
+    return btc_df
+
+def _fetch_btc_live(session):
+    # 只抓过去1天的 1分钟 K线，取最后一根，这是最接近 TradingView 的价格
+    return yf.download('BTC-USD', period='1d', interval='1m', progress=False, session=session)
+
+@st.cache_data(ttl=MAX_TTL)
+def get_market_data(cfg, start_date, end_date, ttl_bucket):
+    # 时间窗口由调用方按 UTC 自然日给出，作为缓存键的一部分，同一天的用户共享缓存
+    # 注意：美联储的 end_date 用今天即可，因为美联储数据没那么快
+    fred_end = end_date
+    # 🌟 关键修正：BTC 结束日期设为“明天”，确保包含“今天”的实时K线
+    btc_end = (datetime.date.fromisoformat(end_date) + datetime.timedelta(days=1)).isoformat()
+
+    # 有本地缓存时只抓增量尾部
+    history = _load_history()
+    fred_start = _tail_start(history, 'Net_Liquidity', start_date)
+    btc_start = _tail_start(history, 'BTC_Price', start_date)
+
+    # 三个请求互不依赖，并发发出，总耗时取决于最慢的一个
+    ex, yf_session = _fetch_pool(), _yf_session()
+    f_fred = ex.submit(_fetch_fred, _http_session(), fred_start, fred_end)
+    f_btc = ex.submit(_fetch_btc_daily, yf_session, btc_start, btc_end)
+    f_live = ex.submit(_fetch_btc_live, yf_session) if cfg.fetch_live_minute else None
+
+    # --- 1. 美联储流动性 (FRED) ---
+    try:
+        fred_data = f_fred.result()
     except Exception as e:
         st.error(f"美联储数据获取失败: {e}")
-        return None, None
+        return None, None, None
     
-    # --- 2. 获取比特币日线数据 (用于画图) ---
+    # --- 2. 比特币日线数据 (用于画图) ---
     try:
-        # 使用 period 替代 start/end 可以更智能地获取最新数据
-        btc_data = yf.download('BTC-USD', start=start_date, end=end_date, interval="1d", progress=False)
-        if isinstance(btc_data.columns, pd.MultiIndex): btc_df = btc_data['Close']
-        else: btc_df = btc_data[['Close']]
-        
-        # 清洗
-        btc_df.index = pd.to_datetime(btc_df.index)
-        if btc_df.index.tz is not None: btc_df.index = btc_df.index.tz_localize(None)
-        
-        # 统一列名
-        if isinstance(btc_df, pd.Series): btc_df = btc_df.to_frame(name='BTC_Price')
-        else: btc_df.rename(columns={'Close': 'BTC_Price'}, inplace=True)
-        if 'BTC_Price' not in btc_df.columns: btc_df.columns = ['BTC_Price']
-
+        btc_df = f_btc.result()
     except Exception as e:
         st.error(f"比特币日线获取失败: {e}")
-        return None, None
+        return None, None, None
+    if btc_df.empty:
+        st.error("比特币日线获取失败: 返回数据为空")
+        return None, None, None
 
     # --- 3. 🌟 额外获取：当前最新实时价格 (用于顶部大数字) ---
+    # 未开启或抓不到分钟线时用空表，降级使用日线的最后一个价格
+    try:
+        live_data = f_live.result() if f_live is not None else pd.DataFrame()
+    except Exception:
+        live_data = pd.DataFrame()
+    daily_close = float(btc_df['BTC_Price'].iloc[-1])
     try:
-        # 只抓过去1天的 1分钟 K线，取最后一根，这是最接近 TradingView 的价格
-        live_data = yf.download('BTC-USD', period='1d', interval='1m', progress=False)
-        if not live_data.empty:
-            # 无论数据结构如何，取最后一行 Close
-            if isinstance(live_data.columns, pd.MultiIndex): 
-                current_price = float(live_data['Close'].iloc[-1].iloc[0]) if isinstance(live_data['Close'].iloc[-1], pd.Series) else float(live_data['Close'].iloc[-1])
-            else:
-                current_price = float(live_data['Close'].iloc[-1])
-        else:
-            # 如果抓不到分钟线，降级使用日线的最后一个价格
-            current_price = float(btc_df['BTC_Price'].iloc[-1])
-    except:
-        current_price = float(btc_df['BTC_Price'].iloc[-1])
+        # 无论数据结构如何（单列/多层列），展平后取最后一个 Close
+        current_price = float(np.asarray(live_data['Close']).ravel()[-1]) if not live_data.empty else daily_close
+    except (KeyError, IndexError):
+        current_price = daily_close
 
     # --- 4. 合并数据 (用于画图) ---
     try:
-        df_liq = fred_data[['Net_Liquidity']]
-        # 使用 outer join 确保即使美联储今天没更新，BTC数据也能显示
-        df = df_liq.join(btc_df, how='outer').ffill().dropna()
+        # 两边都是已排序的 DatetimeIndex，直接按索引 concat 对齐
+        # 缓存里保存的是 outer 对齐、未填充的原始序列，新抓到的值优先
+        new = pd.concat([fred_data[['Net_Liquidity']], btc_df], axis=1, join='outer', sort=True)
+        history = new if history is None else new.combine_first(history)
+        history = history.loc[start_date:]
+        _save_history(history)
+
+        # 涨跌幅的基准取 BTC 日线自身的前一根收盘，与顶部价格同一序列；
+        # inner join 的图表数据会停在美联储最后发布日，不能拿来做基准
+        btc_hist = history['BTC_Price'].dropna()
+        prev_close = float(btc_hist.iloc[-2]) if len(btc_hist) > 1 else daily_close
+
+        # outer + ffill 确保即使美联储今天没更新，BTC数据也能显示
+        df = history if cfg.join == 'outer' else history.dropna()
+        if cfg.ffill_after_join: df = df.ffill()
+        df = df.dropna()
     except Exception as e:
         st.error(f"数据合并失败: {e}")
-        return None, None
+        return None, None, None
     
-    return df, current_price
+    return df, current_price, prev_close
 
 # ==========================================
 # 🧮 信号计算
 # ==========================================
-def calculate_signal(df):
-    df['Liq_SMA_20'] = df['Net_Liquidity'].rolling(window=20).mean()
-    df['BTC_SMA_20'] = df['BTC_Price'].rolling(window=20).mean()
-    df['Correlation'] = df['Net_Liquidity'].rolling(window=30).corr(df['BTC_Price'])
-
-    def get_status(row):
-        liq_trend_up = row['Net_Liquidity'] > row['Liq_SMA_20']
-        btc_trend_up = row['BTC_Price'] > row['BTC_SMA_20']
-        if liq_trend_up and btc_trend_up: return "🟢 STRONG LONG"
-        elif not liq_trend_up and btc_trend_up: return "🔴 DIVERGENCE (Risk)"
-        elif liq_trend_up and not btc_trend_up: return "🟡 BUY OPPORTUNITY"
-        else: return "⚪ NEUTRAL"
-
-    df['Signal'] = df.apply(get_status, axis=1)
-    return df
+# 行情不变时，控件交互触发的重跑直接命中缓存，不再重算滚动指标
+@st.cache_data(ttl=300, show_spinner=False)
+def calculate_signal(cfg, df):
+    # 均线/相关性用 float64 输入计算，float32 只用于下面返回给图表的数据
+    # 全部用局部数组，不改动传入的 df，结果不依赖缓存是否命中
+    liq = df['Net_Liquidity'].to_numpy(dtype=np.float64)
+    btc = df['BTC_Price'].to_numpy(dtype=np.float64)
+    liq_sma = bn.move_mean(liq, window=20, min_count=20)
+    btc_sma = bn.move_mean(btc, window=20, min_count=20)
+    corr = rolling_corr(liq, btc, 30)
+
+    # 向量化判定趋势，避免逐行 apply
+    liq_up = liq > liq_sma
+    btc_up = btc > btc_sma
+    strong = liq_up & btc_up
+    if cfg.include_correlation_signal:
+        strong &= corr > 0.5
+    conds = [strong, ~liq_up & btc_up, liq_up & ~btc_up]
+    choices = ["🟢 STRONG LONG", "🔴 DIVERGENCE (Risk)", "🟡 BUY OPPORTUNITY"]
+    signal = np.select(conds, choices, default="⚪ NEUTRAL")
+
+    # 只返回渲染用得到的部分：画图的两列 + 指标卡读取的最新一行
+    # 画图数据用 float32 精度足够，缓存与序列化体积减半
+    plot_df = df[['Net_Liquidity', 'BTC_Price']].astype('float32')
+    latest = {
+        'BTC_Price': float(btc[-1]),
+        'Net_Liquidity': float(liq[-1]),
+        'Correlation': float(corr[-1]),
+        'Signal': str(signal[-1]),
+    }
+    return plot_df, latest
 
 # ==========================================
-# 🖥️ 界面渲染
+# 📈 图表构建
 # ==========================================
-st.title("📡 Macro Radar (Real-Time)")
-st.caption(f"Last Check: {datetime.datetime.now().strftime('%H:%M:%S')} | Source: Yahoo Finance (1m Live) + FRED")
+# 超过该点数时用 LTTB 降采样，浏览器端渲染量与数据长度无关
+MAX_PLOT_POINTS = 2000
+
+def _downsample(series):
+    if len(series) <= MAX_PLOT_POINTS:
+        return series
+    x = series.index.asi8.astype(np.float64)
+    y = series.to_numpy(dtype=np.float64)
+    return series.iloc[lttb_indices(x, y, MAX_PLOT_POINTS)]
 
+# 缓存序列化后的 JSON，命中时跳过 Figure 对象的逐 trace 构建
+@st.cache_data(show_spinner=False)
+def build_fig_json(df):
+    liq = _downsample(df['Net_Liquidity'])
+    btc = _downsample(df['BTC_Price'])
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    # Scattergl 走 WebGL 渲染，点数增多时绘制开销基本不变
+    fig.add_trace(go.Scattergl(x=liq.index, y=liq, name="Liquidity", fill='tozeroy', line=dict(color='rgba(0, 180, 255, 0.5)')), secondary_y=False)
+    fig.add_trace(go.Scattergl(x=btc.index, y=btc, name="BTC (Daily Close)", line=dict(color='#F7931A')), secondary_y=True)
+    # uirevision 固定，重跑时保留用户的缩放/平移状态
+    fig.update_layout(template="plotly_dark", height=600, hovermode="x unified", uirevision='static')
+    return fig.to_json()
+
+# ==========================================
+# 🖥️ 界面渲染
+# ==========================================
 # 侧边栏
 st.sidebar.header("Control Panel")
+preset = st.sidebar.selectbox("Mode", list(PRESETS))
+cfg = PRESETS[preset]
 if st.sidebar.button("🔄 Force Refresh"):
+    # 同时删掉磁盘历史，强制完整重新下载
+    _clear_history()
     st.cache_data.clear()
     st.rerun()
 
+source = "Yahoo Finance (1m Live) + FRED" if cfg.fetch_live_minute else "Yahoo Finance + FRED"
+st.title(f"📡 Macro Radar ({preset})")
+st.caption(f"Last Check: {datetime.datetime.now().strftime('%H:%M:%S')} | Source: {source}")
+
 with st.spinner('Syncing with global markets...'):
-    df, live_price = get_market_data()
+    today_utc = datetime.datetime.now(datetime.timezone.utc).date()
+    start_date = (today_utc - datetime.timedelta(days=1095)).isoformat()
+    df, live_price, prev_close = get_market_data(cfg, start_date, today_utc.isoformat(), int(time.time() // cfg.ttl))
     
     if df is not None and not df.empty:
-        df = calculate_signal(df)
-        latest_chart = df.iloc[-1]
+        plot_df, latest = calculate_signal(cfg, df)
         
-        # 计算涨跌幅 (基于图表前一日收盘价)
-        prev_close = df['BTC_Price'].iloc[-2]
+        # 计算涨跌幅 (基于 BTC 日线前一日收盘价)
         delta_val = live_price - prev_close
         
         # 指标卡
         c1, c2, c3, c4 = st.columns(4)
         
-        # 🌟 这里的 live_price 是专门抓取的分钟级最新价
-        c1.metric("BTC Price (Live)", f"${live_price:,.2f}", f"{delta_val:,.2f}")
-        c2.metric("Net Liquidity", f"${latest_chart['Net_Liquidity']:,.2f} B")
-        c3.metric("Correlation", f"{latest_chart['Correlation']:.2f}")
-        c4.info(f"Signal: {latest_chart['Signal']}")
+        # 🌟 Realtime 模式下 live_price 是专门抓取的分钟级最新价
+        c1.metric("BTC Price (Live)" if cfg.fetch_live_minute else "BTC Price", f"${live_price:,.2f}", f"{delta_val:,.2f}")
+        c2.metric("Net Liquidity", f"${latest['Net_Liquidity']:,.2f} B")
+        c3.metric("Correlation", f"{latest['Correlation']:.2f}")
+        c4.info(f"Signal: {latest['Signal']}")
 
         # 图表
-        fig = make_subplots(specs=[[{"secondary_y": True}]])
-        fig.add_trace(go.Scatter(x=df.index, y=df['Net_Liquidity'], name="Liquidity", fill='tozeroy', line=dict(color='rgba(0, 180, 255, 0.5)')), secondary_y=False)
-        fig.add_trace(go.Scatter(x=df.index, y=df['BTC_Price'], name="BTC (Daily Close)", line=dict(color='#F7931A')), secondary_y=True)
-        fig.update_layout(template="plotly_dark", height=600, hovermode="x unified")
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(pio.from_json(build_fig_json(plot_df)), use_container_width=True, theme=None)
@@ -0,0 +1,80 @@
+# ==========================================
+# 🧮 数值内核
+# ==========================================
+# rolling_corr / lttb_indices 为纯 Python 写法，同时供 numba JIT 与
+# numba AOT (build_kernels.py) 编译，这里不加任何装饰器；
+# rolling_corr_windows 是无需编译的纯 NumPy 版本
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+def rolling_corr(x, y, w):
+    # 滚动皮尔逊相关：每步只加入新元素、减去离开窗口的元素，O(N)
+    # 累加和一律用 float64，避免大数相减时丢精度；输出为 float32
+    n = len(x)
+    out = np.full(n, np.nan, dtype=np.float32)
+    sx = sy = sxx = syy = sxy = 0.0
+    for i in range(n):
+        xi, yi = np.float64(x[i]), np.float64(y[i])
+        sx += xi
+        sy += yi
+        sxx += xi * xi
+        syy += yi * yi
+        sxy += xi * yi
+        if i >= w:
+            xj, yj = np.float64(x[i - w]), np.float64(y[i - w])
+            sx -= xj
+            sy -= yj
+            sxx -= xj * xj
+            syy -= yj * yj
+            sxy -= xj * yj
+        if i >= w - 1:
+            # 方差项是两个大数之差，累计舍入误差与 w*sxx 同量级；
+            # 低于相对阈值视为零方差窗口，输出 NaN
+            vx = w * sxx - sx * sx
+            vy = w * syy - sy * sy
+            if vx > 1e-12 * w * sxx and vy > 1e-12 * w * syy:
+                out[i] = (w * sxy - sx * sy) / np.sqrt(vx * vy)
+    return out
+
+def rolling_corr_windows(x, y, w):
+    # 纯 NumPy 版滚动相关：窗口视图上沿 axis=1 归约，无需编译，供未预编译时使用
+    out = np.full(len(x), np.nan, dtype=np.float32)
+    if len(x) < w:
+        return out
+    wx = sliding_window_view(np.asarray(x, dtype=np.float64), w)
+    wy = sliding_window_view(np.asarray(y, dtype=np.float64), w)
+    dx = wx - wx.mean(axis=1, keepdims=True)
+    dy = wy - wy.mean(axis=1, keepdims=True)
+    num = (dx * dy).sum(axis=1)
+    den = np.sqrt((dx * dx).sum(axis=1) * (dy * dy).sum(axis=1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[w - 1:] = np.where(den > 0, num / den, np.nan)
+    return out
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets：每个桶保留与前一选中点、下一桶均值围成面积最大的点
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0] = 0
+    out[n_out - 1] = n - 1
+    every = (n - 2) / (n_out - 2)
+    a = 0
+    for i in range(n_out - 2):
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[avg_start:avg_end].mean()
+        avg_y = y[avg_start:avg_end].mean()
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        max_area = -1.0
+        next_a = range_start
+        for j in range(range_start, range_end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > max_area:
+                max_area = area
+                next_a = j
+        out[i + 1] = next_a
+        a = next_a
+    return out
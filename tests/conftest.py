@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 测试直接 import 仓库根目录下的 kernels / signal_kernels
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import kernels
+
+W = 30
+
+
+def _corr_paths():
+    # cloud_app.py 实际可能走到的三条实现：NumPy 窗口版、JIT、AOT（已构建时）
+    paths = [pytest.param(kernels.rolling_corr_windows, id="numpy")]
+    try:
+        from numba import njit
+        paths.append(pytest.param(njit(cache=True)(kernels.rolling_corr), id="jit"))
+    except ImportError:
+        pass
+    try:
+        import signal_kernels
+        paths.append(pytest.param(signal_kernels.rolling_corr, id="aot"))
+    except ImportError:
+        pass
+    return paths
+
+
+def _lttb_paths():
+    paths = []
+    try:
+        from numba import njit
+        paths.append(pytest.param(njit(cache=True)(kernels.lttb_indices), id="jit"))
+    except ImportError:
+        pass
+    try:
+        import signal_kernels
+        paths.append(pytest.param(signal_kernels.lttb_indices, id="aot"))
+    except ImportError:
+        pass
+    return paths
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(0)
+    liq = (6000 + rng.normal(0, 10, 1100).cumsum()).astype(np.float32)
+    btc = (60000 + rng.normal(0, 1000, 1100).cumsum()).astype(np.float32)
+    # 中间插入一段常数，构造零方差窗口
+    liq[500:560] = liq[500]
+    return liq, btc
+
+
+@pytest.mark.parametrize("rolling_corr", _corr_paths())
+def test_rolling_corr_matches_pandas(rolling_corr, series):
+    liq, btc = series
+    x, y = liq.astype(np.float64), btc.astype(np.float64)
+    expected = pd.Series(x).rolling(W).corr(pd.Series(y)).to_numpy()
+    got = rolling_corr(x, y, W)
+
+    assert got.dtype == np.float32
+    assert got.shape == x.shape
+    # 前 W-1 个位置补 NaN
+    assert np.isnan(got[:W - 1]).all()
+    # 完全落在常数段内的窗口方差为 0，结果为 NaN（pandas 这里会给出 ~1e-6 的舍入噪声）
+    flat = np.zeros(len(x), dtype=bool)
+    flat[500 + W - 1:560] = True
+    assert np.isnan(got[flat]).all()
+    valid = np.isfinite(expected) & ~flat
+    assert np.isfinite(got[valid]).all()
+    np.testing.assert_allclose(got[valid], expected[valid], rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("rolling_corr", _corr_paths())
+def test_rolling_corr_shorter_than_window(rolling_corr):
+    x = np.arange(10, dtype=np.float64)
+    assert np.isnan(rolling_corr(x, x, W)).all()
+
+
+@pytest.mark.parametrize("lttb_indices", _lttb_paths())
+@pytest.mark.parametrize("n, n_out", [(10000, 2000), (2001, 2000), (100, 3)])
+def test_lttb_indices_invariants(lttb_indices, n, n_out):
+    x = np.arange(n, dtype=np.float64)
+    y = np.sin(x / 50) + np.random.default_rng(1).random(n)
+    idx = lttb_indices(x, y, n_out)
+
+    assert len(idx) == n_out
+    assert idx[0] == 0 and idx[-1] == n - 1
+    assert (np.diff(idx) > 0).all()
+
+
+@pytest.mark.parametrize("lttb_indices", _lttb_paths())
+def test_lttb_indices_passthrough(lttb_indices):
+    x = np.arange(50, dtype=np.float64)
+    np.testing.assert_array_equal(lttb_indices(x, x, 2000), np.arange(50))